@@ -1,12 +1,25 @@
+import functools
+import math
+from collections import deque
+
 import pygame
+import pygame.freetype
 import sympy as sp
 
+try:
+    # Optional: SymEngine does the term arithmetic in C++ when it is installed.
+    import symengine as se
+except ImportError:
+    se = None
+
 pygame.init()
+pygame.freetype.init()
 
 # Screen setup
 WIDTH, HEIGHT = 1000, 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("SymPy Drag & Solve")
+clock = pygame.time.Clock()
 
 # Colors
 WHITE = (255, 255, 255)
@@ -16,13 +29,34 @@ GREEN = (0, 255, 0)
 GRAY = (200, 200, 200)
 
 # Fonts
-font = pygame.font.Font(None, 36)
+# FreeType's default font at the size pygame.font.Font(None, 36) would use (it scales the
+# default font by 0.6875). Kerning is off for cheaper layout; padding stays on so every
+# label keeps the same line box and text does not shift vertically with its glyphs.
+font = pygame.freetype.Font(None, 36 * 0.6875)
+font.kerning = False
+font.pad = True
+
+@functools.lru_cache(maxsize=512)
+def _render(text, color):
+    # Labels only change on drop/solve events, so rasterize each (text, color) once,
+    # converted to the display's pixel format so later blits skip per-pixel conversion.
+    # This doubles as the label atlas: every draggable term takes its sprites from here
+    # when it is parsed, and terms with the same text share one surface.
+    return font.render(text, color)[0].convert_alpha()
 
 # Define the symbol and initial expression.
 x = sp.Symbol('x')
 # Example: 2*x + 3 - 5. You can change this to any expression.
 expr = sp.sympify("2*x + 3 - 5")
 
+def to_backend(expr_value):
+    """Converts a SymPy object to the type equation building runs on (SymEngine if available)."""
+    return se.sympify(expr_value) if se is not None else expr_value
+
+def backend_sum(parts):
+    """Adds up backend terms in one canonicalizing Add instead of a chain of += rebuilds."""
+    return se.Add(*parts) if se is not None else sp.Add(*parts)
+
 # Break the expression into its ordered terms.
 terms_list = expr.as_ordered_terms()
 
@@ -34,100 +68,242 @@ for i, term in enumerate(terms_list):
     label = str(term)
     draggable_terms[label] = {
         "expr": term,
+        "backend_expr": to_backend(term),
         "pos": (200 + i * 150, 200),
-        "location": "lhs"  # Initially, every term is on the LHS.
+        # Hit box around the label, kept in sync with "pos" while dragging.
+        "rect": pygame.Rect(200 + i * 150 - 50, 200 - 20, 150, 60),
+        "location": "lhs",  # Initially, every term is on the LHS.
+        # Pre-rendered labels for each side; "surf" is the one currently shown.
+        "_surf_lhs": _render(label, BLUE),
+        "_surf_rhs": _render(label, GREEN),
+        "surf": _render(label, BLUE),
     }
 
+# Parallel lists of keys and hit boxes (the same Rect objects), so a click is
+# resolved by a single Rect.collidelist call instead of a Python loop.
+term_keys = list(draggable_terms)
+hit_rects = [data["rect"] for data in draggable_terms.values()]
+
 solution = None
-history = []
+# Result lines are wide one-offs, so they are rendered once per result straight into
+# these slots instead of through _render, whose cache is kept for the small label set.
+solution_surf = None
+check_surf = None
+# Session log as text, capped so long sessions don't grow. Only the last 5 entries are
+# drawn (from recent_surfs below); the rest stay inspectable without costing surfaces.
+history = deque(maxlen=64)
+# Pre-rendered surfaces of the last 5 history lines, the only ones ever shown.
+recent_surfs = deque(maxlen=5)
+
+def add_history(msg):
+    """Records msg in the history and renders it for the on-screen tail."""
+    history.append(msg)
+    recent_surfs.append(font.render(msg, GREEN)[0].convert_alpha())
+
+def show_solution(eq):
+    """Renders the line for the current solution, then the check line for eq."""
+    global solution_surf
+    solution_surf = font.render(f"Solution: x = {solution}", BLUE)[0].convert_alpha()
+    update_check(eq)
 
 dragging = False
 selected_key = None
+drag_start_location = None  # Where the dragged term was picked up.
 
-def update_equation():
+# Memoized results keyed by where the objects sit. The initial expression never
+# changes after parsing, so these never need invalidating.
+_eq_cache = {}
+_sol_cache = {}
+_num_cache = {}
+
+def compile_numeric(expr_value):
+    """
+    Turns a sympy expression in x into a plain float function. Not Numba-compiled: each
+    one is evaluated far too few times for a JIT compile to pay for itself.
     """
-    Rebuilds the equation using the current positions:
+    return sp.lambdify(x, expr_value, modules="math", cse=True)
+
+def equation_signature():
+    """Hashable summary of which side each term is on; equal signatures give equal equations."""
+    return tuple(sorted((key, data["location"]) for key, data in draggable_terms.items()))
+
+def build_equation():
+    """
+    Builds the equation from the current positions:
       - Terms in the left box (location 'lhs') are added.
       - Terms in the right box (location 'rhs') are subtracted.
     """
-    lhs_expr = 0
-    rhs_expr = 0
+    parts = []
     for key, data in draggable_terms.items():
         if data["location"] == "lhs":
-            lhs_expr += data["expr"]
+            parts.append(data["backend_expr"])
         else:
             # For terms on the RHS, we subtract them from the LHS.
-            lhs_expr -= data["expr"]
-    # Build the equation as lhs_expr = 0.
-    eq = sp.Eq(lhs_expr, 0)
-    history.append(f"Updated equation: {eq}")
+            parts.append(-data["backend_expr"])
+    # Build the equation as (sum of parts) = 0.
+    return sp.Eq(sp.sympify(backend_sum(parts)), 0)
+
+def current_equation():
+    """Returns the equation for the current layout, reusing it if this layout was seen before."""
+    sig = equation_signature()
+    eq = _eq_cache.get(sig)
+    if eq is None:
+        eq = _eq_cache[sig] = build_equation()
     return eq
 
+def update_equation():
+    """Looks up the equation for the current layout and records it in the history."""
+    eq = current_equation()
+    add_history(f"Updated equation: {eq}")
+    return eq
+
+def residual_of(eq):
+    """
+    Returns LHS - RHS of eq as a float function, lambdified once per equation;
+    None if the equation has collapsed to True/False.
+    """
+    if eq not in _num_cache:
+        _num_cache[eq] = compile_numeric(eq.lhs - eq.rhs) if isinstance(eq, sp.Eq) else None
+    return _num_cache[eq]
+
+def eval_at(eq, val):
+    """Evaluates LHS - RHS of eq at x = val (None if eq has no residual)."""
+    residual = residual_of(eq)
+    if residual is None:
+        return None
+    try:
+        return residual(val)
+    except (ValueError, OverflowError, ZeroDivisionError):
+        return math.nan
+
+def update_check(eq):
+    """
+    Re-renders check_surf: LHS - RHS of eq at the last solution found. Runs on the drop
+    and solve paths, so the draw loop only blits the cached surface.
+    """
+    global check_surf
+    check_surf = None
+    if not isinstance(solution, list) or not solution:
+        return
+    try:
+        val = float(solution[0])
+    except TypeError:
+        return  # Complex or symbolic root.
+    residual = eval_at(eq, val)
+    if residual is not None:
+        text = f"Check: LHS - RHS at x = {val:.6g} -> {residual:.3g}"
+        check_surf = font.render(text, BLUE)[0].convert_alpha()
+
+def linear_root(eq):
+    """
+    Returns [-b/a] if eq is a*x + b = 0, or None so the caller falls back to sp.solve.
+    The common linear case then skips the general solver entirely.
+    """
+    if not isinstance(eq, sp.Eq):
+        return None
+    try:
+        poly = sp.Poly(eq.lhs - eq.rhs, x)
+    except sp.PolynomialError:
+        return None  # e.g. x inside a function such as sin(x).
+    if poly.degree() != 1:
+        return None
+    a, b = poly.all_coeffs()
+    return [sp.together(-b / a)]
+
 def solve_expression(eq):
     global solution
-    solution = sp.solve(eq, x)
-    history.append(f"Solving for x: {eq} -> x = {solution}")
+    if eq not in _sol_cache:
+        roots = linear_root(eq)
+        _sol_cache[eq] = roots if roots is not None else sp.solve(eq, x)
+    solution = _sol_cache[eq]
+    show_solution(eq)
+    add_history(f"Solving for x: {eq} -> x = {solution}")
+
+def scene_items():
+    """
+    Returns the (surface, position) pairs drawn on top of the static background,
+    in draw order: draggable terms, the solution and check lines, then the recent history.
+    """
+    items = []
+    for key, data in draggable_terms.items():
+        items.append((data["surf"], data["pos"]))
+    if solution is not None:
+        items.append((solution_surf, (20, 60)))
+        if check_surf is not None:
+            items.append((check_surf, (20, 90)))
+    for i, surf in enumerate(recent_surfs):
+        items.append((surf, (20, 400 + 30 * i)))
+    return items
 
-def draw_text(text, pos, color=BLACK):
-    render = font.render(text, True, color)
-    screen.blit(render, pos)
+# Static scene (boxes and captions), drawn once and used to erase stale regions.
+background = pygame.Surface((WIDTH, HEIGHT)).convert()
+background.fill(WHITE)
+pygame.draw.rect(background, GRAY, (50, 150, 400, 200))   # LHS box
+pygame.draw.rect(background, GRAY, (550, 150, 400, 200))   # RHS box
+font.render_to(background, (200, 120), "LHS", BLACK)
+font.render_to(background, (700, 120), "RHS", BLACK)
+font.render_to(background, (WIDTH//2 - 20, 230), "=", BLACK)
+screen.blit(background, (0, 0))
+pygame.display.flip()
+drawn_items = set()
 
 running = True
 while running:
-    screen.fill(WHITE)
+    # Repaint only the regions whose contents changed since the last frame.
+    items = scene_items()
+    dirty = [surf.get_rect(topleft=pos) for surf, pos in drawn_items.symmetric_difference(items)]
+    for rect in dirty:
+        screen.set_clip(rect)
+        screen.blit(background, rect, rect)
+        for surf, pos in items:
+            screen.blit(surf, pos)
+    screen.set_clip(None)
+    drawn_items = set(items)
     
-    # Draw LHS and RHS boxes.
-    pygame.draw.rect(screen, GRAY, (50, 150, 400, 200))   # LHS box
-    pygame.draw.rect(screen, GRAY, (550, 150, 400, 200))    # RHS box
-    draw_text("LHS", (200, 120))
-    draw_text("RHS", (700, 120))
-    draw_text("=", (WIDTH // 2 - 20, 230))
-    
-    # Draw all draggable terms.
-    for key, data in draggable_terms.items():
-        col = BLUE if data["location"] == "lhs" else GREEN
-        draw_text(key, data["pos"], col)
-    
-    # Display solution (if available)
-    if solution is not None:
-        draw_text(f"Solution: x = {solution}", (20, 60), BLUE)
-    
-    # Display recent history (last 5 steps)
-    y_offset = 400
-    for hist in history[-5:]:
-        draw_text(hist, (20, y_offset), GREEN)
-        y_offset += 30
-
-    for event in pygame.event.get():
+    # Coalesce runs of MOUSEMOTION events: a fast drag queues many per frame, but only
+    # the last position of each run matters. Clicks keep their order relative to moves.
+    events = pygame.event.get()
+    events = [event for event, following in zip(events, events[1:] + [None])
+              if not (event.type == pygame.MOUSEMOTION and following is not None
+                      and following.type == pygame.MOUSEMOTION)]
+    for event in events:
         if event.type == pygame.QUIT:
             running = False
 
+        elif event.type == pygame.VIDEOEXPOSE:
+            # The window needs repainting; the screen surface still holds the full frame.
+            dirty.append(screen.get_rect())
+
         elif event.type == pygame.MOUSEBUTTONDOWN:
-            mx, my = event.pos
             # Check if mouse is over any term.
-            for key, data in draggable_terms.items():
-                tx, ty = data["pos"]
-                if tx - 50 < mx < tx + 100 and ty - 20 < my < ty + 40:
-                    dragging = True
-                    selected_key = key
-                    break
+            index = pygame.Rect(event.pos, (1, 1)).collidelist(hit_rects)
+            if index != -1:
+                dragging = True
+                selected_key = term_keys[index]
+                drag_start_location = draggable_terms[selected_key]["location"]
 
         elif event.type == pygame.MOUSEBUTTONUP:
             dragging = False
             if selected_key:
                 # Update location based on where the term is dropped.
-                tx, ty = draggable_terms[selected_key]["pos"]
+                data = draggable_terms[selected_key]
+                tx, ty = data["pos"]
                 if tx < WIDTH // 2:
-                    draggable_terms[selected_key]["location"] = "lhs"
+                    data["location"] = "lhs"
+                    data["surf"] = data["_surf_lhs"]
                 else:
-                    draggable_terms[selected_key]["location"] = "rhs"
-                # After moving, update the equation.
-                eq = update_equation()
+                    data["location"] = "rhs"
+                    data["surf"] = data["_surf_rhs"]
+                # After moving to the other side, update the equation; a drop
+                # back on the same side leaves it unchanged.
+                if data["location"] != drag_start_location:
+                    update_check(update_equation())
             selected_key = None
 
         elif event.type == pygame.MOUSEMOTION and dragging:
             # Move the selected term with the mouse.
             draggable_terms[selected_key]["pos"] = event.pos
+            draggable_terms[selected_key]["rect"].topleft = (event.pos[0] - 50, event.pos[1] - 20)
 
         elif event.type == pygame.KEYDOWN:
             # Press S to solve the current equation.
@@ -135,7 +311,9 @@ while running:
                 eq = update_equation()
                 solve_expression(eq)
 
-    pygame.display.flip()
+    pygame.display.update(dirty)
+    # Sleep between frames; an idle UI does not need the full drag frame rate.
+    clock.tick(60 if dragging else 30)
 
 pygame.quit()
 
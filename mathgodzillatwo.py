@@ -1,12 +1,25 @@
+import functools
+import math
+from collections import deque
+
 import pygame
+import pygame.freetype
 import sympy as sp
 
+try:
+    # Optional: SymEngine does the term arithmetic in C++ when it is installed.
+    import symengine as se
+except ImportError:
+    se = None
+
 pygame.init()
+pygame.freetype.init()
 
 # Screen setup
 WIDTH, HEIGHT = 1000, 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("SymPy Drag & Solve")
+clock = pygame.time.Clock()
 
 # Colors
 WHITE = (255, 255, 255)
@@ -16,7 +29,20 @@ GREEN = (0, 255, 0)    # For objects on RHS
 GRAY = (200, 200, 200)
 
 # Fonts
-font = pygame.font.Font(None, 36)
+# FreeType's default font at the size pygame.font.Font(None, 36) would use (it scales the
+# default font by 0.6875). Kerning is off for cheaper layout; padding stays on so every
+# label keeps the same line box and text does not shift vertically with its glyphs.
+font = pygame.freetype.Font(None, 36 * 0.6875)
+font.kerning = False
+font.pad = True
+
+@functools.lru_cache(maxsize=512)
+def _render(text, color):
+    # Labels only change on drop/solve events, so rasterize each (text, color) once,
+    # converted to the display's pixel format so later blits skip per-pixel conversion.
+    # This doubles as the label atlas: every draggable term takes its sprites from here
+    # when it is parsed, and terms with the same text share one surface.
+    return font.render(text, color)[0].convert_alpha()
 
 # Define symbol and initial expression.
 x = sp.Symbol('x')
@@ -24,26 +50,73 @@ expr = sp.sympify("2*x + 3")  # Example expression: 2*x + 3
 
 # Our equation is built as: (sum of contributions) = 0.
 solution = None
-history = []
+# Result lines are wide one-offs, so they are rendered once per result straight into
+# these slots instead of through _render, whose cache is kept for the small label set.
+solution_surf = None
+check_surf = None
+# Session log as text, capped so long sessions don't grow. Only the last 5 entries are
+# drawn (from recent_surfs below); the rest stay inspectable without costing surfaces.
+history = deque(maxlen=64)
+# Pre-rendered surfaces of the last 5 history lines, the only ones ever shown.
+recent_surfs = deque(maxlen=5)
+
+def add_history(msg):
+    """Records msg in the history and renders it for the on-screen tail."""
+    history.append(msg)
+    recent_surfs.append(font.render(msg, GREEN)[0].convert_alpha())
+
+def show_solution(eq):
+    """Renders the line for the current solution, then the check line for eq."""
+    global solution_surf
+    solution_surf = font.render(f"Solution: x = {solution}", BLUE)[0].convert_alpha()
+    update_check(eq)
 
 # We'll represent each draggable item as a dictionary.
 # Each object has an "id", an optional "group" (to link parts of the same term),
 # a "part" (which can be "coeff", "var", or "single"), a display "text",
 # its Sympy "expr", its current screen "pos", and its "location" (either "lhs" or "rhs").
 draggable_objects = []
+# Hit boxes of draggable_objects, index for index (the same Rect objects), so a
+# click is resolved by a single Rect.collidelist call instead of a Python loop.
+hit_rects = []
+# Group id -> {"members": [...], "coeff": obj, "var": obj}, kept in sync by
+# add_draggable_object so equation building never has to search for group members.
+groups = {}
 object_id = 0
 
+def to_backend(expr_value):
+    """Converts a SymPy object to the type equation building runs on (SymEngine if available)."""
+    return se.sympify(expr_value) if se is not None else expr_value
+
+def backend_sum(parts):
+    """Adds up backend terms in one canonicalizing Add instead of a chain of += rebuilds."""
+    return se.Add(*parts) if se is not None else sp.Add(*parts)
+
 def add_draggable_object(group, part, text, expr_value, pos, location="lhs"):
     global object_id
-    draggable_objects.append({
+    rect = pygame.Rect(pos[0] - 50, pos[1] - 20, 150, 60)
+    obj = {
         "id": object_id,
         "group": group,     # None if it's a standalone term; otherwise, a group id.
         "part": part,       # "coeff" for coefficient, "var" for variable part, "single" otherwise.
         "text": text,
         "expr": expr_value, # A Sympy object (number, symbol, or expression).
+        "backend_expr": to_backend(expr_value),  # Same value, for equation building.
         "pos": pos,
-        "location": location
-    })
+        "rect": rect,  # Hit box, follows "pos".
+        "location": location,
+        # Pre-rendered labels for each side; "surf" is the one currently shown.
+        "_surf_lhs": _render(text, BLUE),
+        "_surf_rhs": _render(text, GREEN),
+        "surf": _render(text, BLUE if location == "lhs" else GREEN),
+    }
+    draggable_objects.append(obj)
+    hit_rects.append(rect)
+    if group is not None:
+        entry = groups.setdefault(group, {"members": [], "coeff": None, "var": None})
+        entry["members"].append(obj)
+        if part in ("coeff", "var"):
+            entry[part] = obj
     object_id += 1
 
 # Parse the expression into terms.
@@ -54,10 +127,11 @@ for term in terms_list:
     # If term has x and is a multiplication, try to split it.
     if term.has(x) and term.is_Mul:
         coeff, factors = term.as_coeff_mul(x)
-        # If coefficient is something other than 1 or -1, split into two parts.
-        if coeff != 1 and coeff != -1:
+        # If coefficient is something other than 1 or -1, split into two parts
+        # (both are SymPy singletons, so identity checks avoid an __eq__ round trip).
+        if coeff is not sp.S.One and coeff is not sp.S.NegativeOne:
             add_draggable_object(group=group_id, part="coeff", text=str(coeff),
-                                   expr_value=sp.Integer(coeff), pos=(150 + group_id*150, 200))
+                                   expr_value=coeff, pos=(150 + group_id*150, 200))
             # Reconstruct the variable part (multiplication of the remaining factors).
             var_part = sp.Mul(*factors)
             add_draggable_object(group=group_id, part="var", text=str(var_part),
@@ -76,96 +150,195 @@ for term in terms_list:
 
 dragging = False
 selected_object = None
+drag_start_location = None  # Where the dragged object was picked up.
 
-def update_equation():
+# Memoized results keyed by where the objects sit. The initial expression never
+# changes after parsing, so these never need invalidating.
+_eq_cache = {}
+_sol_cache = {}
+_num_cache = {}
+
+def compile_numeric(expr_value):
     """
-    Rebuilds the equation based on the current positions/locations of the draggable objects.
+    Turns a sympy expression in x into a plain float function. Not Numba-compiled: each
+    one is evaluated far too few times for a JIT compile to pay for itself.
+    """
+    return sp.lambdify(x, expr_value, modules="math", cse=True)
+
+def equation_signature():
+    """Hashable summary of which side each object is on; equal signatures give equal equations."""
+    return tuple(sorted((obj["id"], obj["location"]) for obj in draggable_objects))
+
+def build_equation():
+    """
+    Builds the equation based on the current positions/locations of the draggable objects.
     For compound (grouped) terms, if the coefficient and variable parts are on the same side,
     the effective term is coefficient * variable.
     If they are split (on opposite sides), it applies the inverse: the effective term becomes variable divided by coefficient.
     Each object’s location determines its sign: terms on the LHS contribute positively, those on the RHS negatively.
     """
-    global history
-    lhs_expr = 0
-    processed_groups = set()
+    parts = []
     # Process grouped (compound) terms.
-    for obj in draggable_objects:
-        if obj["group"] is not None:
-            group = obj["group"]
-            if group in processed_groups:
-                continue
-            group_objs = [o for o in draggable_objects if o["group"] == group]
-            if len(group_objs) != 2:
-                continue
-            coeff_obj = next(o for o in group_objs if o["part"] == "coeff")
-            var_obj = next(o for o in group_objs if o["part"] == "var")
-            # If both parts are on the same side, effective factor is the coefficient;
-            # otherwise, moving the coefficient to the opposite side implies dividing by it.
-            if coeff_obj["location"] == var_obj["location"]:
-                effective_factor = coeff_obj["expr"]
-            else:
-                effective_factor = 1 / coeff_obj["expr"]
-            effective_term = effective_factor * var_obj["expr"]
-            # Use the location of the variable part to determine sign.
-            sign = 1 if var_obj["location"] == "lhs" else -1
-            lhs_expr += sign * effective_term
-            processed_groups.add(group)
+    for group in groups.values():
+        if len(group["members"]) != 2:
+            continue
+        coeff_obj = group["coeff"]
+        var_obj = group["var"]
+        # If both parts are on the same side, effective factor is the coefficient;
+        # otherwise, moving the coefficient to the opposite side implies dividing by it.
+        if coeff_obj["location"] == var_obj["location"]:
+            effective_factor = coeff_obj["backend_expr"]
+        else:
+            effective_factor = 1 / coeff_obj["backend_expr"]
+        effective_term = effective_factor * var_obj["backend_expr"]
+        # Use the location of the variable part to determine sign.
+        sign = 1 if var_obj["location"] == "lhs" else -1
+        parts.append(sign * effective_term)
     # Process single objects.
     for obj in draggable_objects:
         if obj["group"] is None:
             sign = 1 if obj["location"] == "lhs" else -1
-            lhs_expr += sign * obj["expr"]
-    eq = sp.Eq(lhs_expr, 0)
-    history.append(f"Updated equation: {eq}")
+            parts.append(sign * obj["backend_expr"])
+    return sp.Eq(sp.sympify(backend_sum(parts)), 0)
+
+def current_equation():
+    """Returns the equation for the current layout, reusing it if this layout was seen before."""
+    sig = equation_signature()
+    eq = _eq_cache.get(sig)
+    if eq is None:
+        eq = _eq_cache[sig] = build_equation()
     return eq
 
+def update_equation():
+    """Looks up the equation for the current layout and records it in the history."""
+    eq = current_equation()
+    add_history(f"Updated equation: {eq}")
+    return eq
+
+def residual_of(eq):
+    """
+    Returns LHS - RHS of eq as a float function, lambdified once per equation;
+    None if the equation has collapsed to True/False.
+    """
+    if eq not in _num_cache:
+        _num_cache[eq] = compile_numeric(eq.lhs - eq.rhs) if isinstance(eq, sp.Eq) else None
+    return _num_cache[eq]
+
+def eval_at(eq, val):
+    """Evaluates LHS - RHS of eq at x = val (None if eq has no residual)."""
+    residual = residual_of(eq)
+    if residual is None:
+        return None
+    try:
+        return residual(val)
+    except (ValueError, OverflowError, ZeroDivisionError):
+        return math.nan
+
+def update_check(eq):
+    """
+    Re-renders check_surf: LHS - RHS of eq at the last solution found. Runs on the drop
+    and solve paths, so the draw loop only blits the cached surface.
+    """
+    global check_surf
+    check_surf = None
+    if not isinstance(solution, list) or not solution:
+        return
+    try:
+        val = float(solution[0])
+    except TypeError:
+        return  # Complex or symbolic root.
+    residual = eval_at(eq, val)
+    if residual is not None:
+        text = f"Check: LHS - RHS at x = {val:.6g} -> {residual:.3g}"
+        check_surf = font.render(text, BLUE)[0].convert_alpha()
+
+def linear_root(eq):
+    """
+    Returns [-b/a] if eq is a*x + b = 0, or None so the caller falls back to sp.solve.
+    The common linear case then skips the general solver entirely.
+    """
+    if not isinstance(eq, sp.Eq):
+        return None
+    try:
+        poly = sp.Poly(eq.lhs - eq.rhs, x)
+    except sp.PolynomialError:
+        return None  # e.g. x inside a function such as sin(x).
+    if poly.degree() != 1:
+        return None
+    a, b = poly.all_coeffs()
+    return [sp.together(-b / a)]
+
 def solve_equation(eq):
-    global solution, history
-    solution = sp.solve(eq, x)
-    history.append(f"Solved equation: {eq} -> x = {solution}")
+    global solution
+    if eq not in _sol_cache:
+        roots = linear_root(eq)
+        _sol_cache[eq] = roots if roots is not None else sp.solve(eq, x)
+    solution = _sol_cache[eq]
+    show_solution(eq)
+    add_history(f"Solved equation: {eq} -> x = {solution}")
+
+def scene_items():
+    """
+    Returns the (surface, position) pairs drawn on top of the static background,
+    in draw order: draggable terms, the solution and check lines, then the recent history.
+    """
+    items = []
+    for obj in draggable_objects:
+        items.append((obj["surf"], obj["pos"]))
+    if solution is not None:
+        items.append((solution_surf, (20, 60)))
+        if check_surf is not None:
+            items.append((check_surf, (20, 90)))
+    for i, surf in enumerate(recent_surfs):
+        items.append((surf, (20, 400 + 30 * i)))
+    return items
 
-def draw_text(text, pos, color=BLACK):
-    render = font.render(text, True, color)
-    screen.blit(render, pos)
+# Static scene (boxes and captions), drawn once and used to erase stale regions.
+background = pygame.Surface((WIDTH, HEIGHT)).convert()
+background.fill(WHITE)
+pygame.draw.rect(background, GRAY, (50, 150, 400, 200))   # LHS box
+pygame.draw.rect(background, GRAY, (550, 150, 400, 200))   # RHS box
+font.render_to(background, (200, 120), "LHS", BLACK)
+font.render_to(background, (700, 120), "RHS", BLACK)
+font.render_to(background, (WIDTH//2 - 20, 230), "=", BLACK)
+screen.blit(background, (0, 0))
+pygame.display.flip()
+drawn_items = set()
 
 running = True
 while running:
-    screen.fill(WHITE)
-    # Draw LHS and RHS boxes.
-    pygame.draw.rect(screen, GRAY, (50, 150, 400, 200))   # LHS box
-    pygame.draw.rect(screen, GRAY, (550, 150, 400, 200))    # RHS box
-    draw_text("LHS", (200, 120))
-    draw_text("RHS", (700, 120))
-    draw_text("=", (WIDTH//2 - 20, 230))
-    
-    # Draw all draggable objects.
-    for obj in draggable_objects:
-        col = BLUE if obj["location"] == "lhs" else GREEN
-        draw_text(obj["text"], obj["pos"], col)
+    # Repaint only the regions whose contents changed since the last frame.
+    items = scene_items()
+    dirty = [surf.get_rect(topleft=pos) for surf, pos in drawn_items.symmetric_difference(items)]
+    for rect in dirty:
+        screen.set_clip(rect)
+        screen.blit(background, rect, rect)
+        for surf, pos in items:
+            screen.blit(surf, pos)
+    screen.set_clip(None)
+    drawn_items = set(items)
     
-    # Display solution (if available).
-    if solution is not None:
-        draw_text(f"Solution: x = {solution}", (20, 60), BLUE)
-    
-    # Display recent history.
-    y_offset = 400
-    for hist in history[-5:]:
-        draw_text(hist, (20, y_offset), GREEN)
-        y_offset += 30
-    
-    for event in pygame.event.get():
+    # Coalesce runs of MOUSEMOTION events: a fast drag queues many per frame, but only
+    # the last position of each run matters. Clicks keep their order relative to moves.
+    events = pygame.event.get()
+    events = [event for event, following in zip(events, events[1:] + [None])
+              if not (event.type == pygame.MOUSEMOTION and following is not None
+                      and following.type == pygame.MOUSEMOTION)]
+    for event in events:
         if event.type == pygame.QUIT:
             running = False
         
+        elif event.type == pygame.VIDEOEXPOSE:
+            # The window needs repainting; the screen surface still holds the full frame.
+            dirty.append(screen.get_rect())
+        
         elif event.type == pygame.MOUSEBUTTONDOWN:
-            mx, my = event.pos
-            for obj in draggable_objects:
-                ox, oy = obj["pos"]
-                # Simple hit detection.
-                if ox - 50 < mx < ox + 100 and oy - 20 < my < oy + 40:
-                    dragging = True
-                    selected_object = obj
-                    break
+            # Simple hit detection.
+            index = pygame.Rect(event.pos, (1, 1)).collidelist(hit_rects)
+            if index != -1:
+                dragging = True
+                selected_object = draggable_objects[index]
+                drag_start_location = selected_object["location"]
         
         elif event.type == pygame.MOUSEBUTTONUP:
             dragging = False
@@ -174,13 +347,18 @@ while running:
                 ox, _ = selected_object["pos"]
                 if ox < WIDTH // 2:
                     selected_object["location"] = "lhs"
+                    selected_object["surf"] = selected_object["_surf_lhs"]
                 else:
                     selected_object["location"] = "rhs"
-                eq = update_equation()
+                    selected_object["surf"] = selected_object["_surf_rhs"]
+                # A drop back on the same side leaves the equation unchanged.
+                if selected_object["location"] != drag_start_location:
+                    update_check(update_equation())
             selected_object = None
         
         elif event.type == pygame.MOUSEMOTION and dragging:
             selected_object["pos"] = event.pos
+            selected_object["rect"].topleft = (event.pos[0] - 50, event.pos[1] - 20)
         
         elif event.type == pygame.KEYDOWN:
             # Press S to update the equation and solve for x.
@@ -188,7 +366,9 @@ while running:
                 eq = update_equation()
                 solve_equation(eq)
     
-    pygame.display.flip()
+    pygame.display.update(dirty)
+    # Sleep between frames; an idle UI does not need the full drag frame rate.
+    clock.tick(60 if dragging else 30)
 
 pygame.quit()
 
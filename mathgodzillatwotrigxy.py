@@ -1,12 +1,24 @@
+import functools
+from collections import deque
+
 import pygame
+import pygame.freetype
 import sympy as sp
 
+try:
+    # Optional: SymEngine does the term arithmetic in C++ when it is installed.
+    import symengine as se
+except ImportError:
+    se = None
+
 pygame.init()
+pygame.freetype.init()
 
 # Screen setup
 WIDTH, HEIGHT = 1200, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Advanced SymPy Drag & Solve (x, y)")
+clock = pygame.time.Clock()
 
 # Colors
 WHITE = (255, 255, 255)
@@ -16,7 +28,20 @@ GREEN = (0, 255, 0)    # For objects on RHS
 GRAY = (200, 200, 200)
 
 # Fonts
-font = pygame.font.Font(None, 28)
+# FreeType's default font at the size pygame.font.Font(None, 28) would use (it scales the
+# default font by 0.6875). Kerning is off for cheaper layout; padding stays on so every
+# label keeps the same line box and text does not shift vertically with its glyphs.
+font = pygame.freetype.Font(None, 28 * 0.6875)
+font.kerning = False
+font.pad = True
+
+@functools.lru_cache(maxsize=512)
+def _render(text, color):
+    # Labels only change on drop/solve events, so rasterize each (text, color) once,
+    # converted to the display's pixel format so later blits skip per-pixel conversion.
+    # This doubles as the label atlas: every draggable term takes its sprites from here
+    # when it is parsed, and terms with the same text share one surface.
+    return font.render(text, color)[0].convert_alpha()
 
 # Define symbols and a two-variable expression.
 x, y = sp.symbols('x y')
@@ -24,13 +49,36 @@ x, y = sp.symbols('x y')
 expr = sp.sympify("2*sin(x) + 3*cos(y) + exp(x) + tanh(y)")
 
 solution = None
-history = []
+# Result lines are wide one-offs, so they are rendered once per result straight into
+# these slots instead of through _render, whose cache is kept for the small label set.
+solution_surf = None
+# Session log as text, capped so long sessions don't grow. Only the last 5 entries are
+# drawn (from recent_surfs below); the rest stay inspectable without costing surfaces.
+history = deque(maxlen=64)
+# Pre-rendered surfaces of the last 5 history lines, the only ones ever shown.
+recent_surfs = deque(maxlen=5)
+
+def add_history(msg):
+    """Records msg in the history and renders it for the on-screen tail."""
+    history.append(msg)
+    recent_surfs.append(font.render(msg, GREEN)[0].convert_alpha())
+
+def show_solution():
+    """Renders the line for the current solution."""
+    global solution_surf
+    solution_surf = font.render(f"Solution: (x, y) = {solution}", BLUE)[0].convert_alpha()
 
 # Each draggable item is represented as a dictionary.
 # It stores: id, group (for compound terms), part (e.g. 'coeff', 'func', 'var', or 'single'),
 # text (for display), its sympy expression, current position, location ('lhs' or 'rhs'),
 # and an 'inverted' flag (for functions).
 draggable_objects = []
+# Hit boxes of draggable_objects, index for index (the same Rect objects), so a
+# click is resolved by a single Rect.collidelist call instead of a Python loop.
+hit_rects = []
+# Group id -> {"members": [...], "coeff": obj, "other": obj}, kept in sync by
+# add_draggable_object so equation building never has to search for group members.
+groups = {}
 object_id = 0
 
 # Mapping for functions to their inverses (if available).
@@ -42,18 +90,46 @@ inverse_mapping = {
     sp.tanh: sp.atanh,
 }
 
+def to_backend(expr_value):
+    """Converts a SymPy object to the type equation building runs on (SymEngine if available)."""
+    return se.sympify(expr_value) if se is not None else expr_value
+
+def backend_sum(parts):
+    """Adds up backend terms in one canonicalizing Add instead of a chain of += rebuilds."""
+    return se.Add(*parts) if se is not None else sp.Add(*parts)
+
 def add_draggable_object(group, part, text, expr_value, pos, location="lhs"):
     global object_id
-    draggable_objects.append({
+    rect = pygame.Rect(pos[0] - 50, pos[1] - 20, 150, 60)
+    obj = {
         "id": object_id,
         "group": group,       # If not None, indicates this object is linked with others.
         "part": part,         # "coeff", "func", "var", or "single".
         "text": text,
         "expr": expr_value,   # A sympy object (number, symbol, function, etc.)
+        "backend_expr": to_backend(expr_value),  # Same value, for equation building.
         "pos": pos,
+        "rect": rect,  # Hit box, follows "pos".
         "location": location, # "lhs" or "rhs"
-        "inverted": False     # For function objects: if moved to the opposite side.
-    })
+        "inverted": False,    # For function objects: if moved to the opposite side.
+        # What a function object becomes when inverted, worked out once here (None if
+        # the object is not a function or has no inverse in the mapping).
+        "inverse_expr": (to_backend(inverse_mapping[expr_value.func](expr_value.args[0]))
+                         if part == "func" and expr_value.func in inverse_mapping else None),
+        # Pre-rendered labels for each side; "surf" is the one currently shown.
+        "_surf_lhs": _render(text, BLUE),
+        "_surf_rhs": _render(text, GREEN),
+        "surf": _render(text, BLUE if location == "lhs" else GREEN),
+    }
+    draggable_objects.append(obj)
+    hit_rects.append(rect)
+    if group is not None:
+        entry = groups.setdefault(group, {"members": [], "coeff": None, "other": None})
+        entry["members"].append(obj)
+        if part == "coeff":
+            entry["coeff"] = obj
+        elif entry["other"] is None:
+            entry["other"] = obj
     object_id += 1
 
 # Parse the expression into draggable objects.
@@ -64,9 +140,10 @@ for term in terms_list:
     # If the term involves x or y and is a multiplication, try to split the coefficient from the rest.
     if (term.has(x) or term.has(y)) and term.is_Mul:
         coeff, rest = term.as_coeff_Mul()
-        if coeff not in [1, -1]:
+        # 1 and -1 are SymPy singletons, so identity checks avoid two __eq__ round trips.
+        if coeff is not sp.S.One and coeff is not sp.S.NegativeOne:
             add_draggable_object(group=group_id, part="coeff", text=str(coeff),
-                                   expr_value=sp.Integer(coeff), pos=(150 + group_id*180, 200))
+                                   expr_value=coeff, pos=(150 + group_id*180, 200))
             add_draggable_object(group=group_id, part="var", text=str(rest),
                                    expr_value=rest, pos=(150 + group_id*180 + 60, 200))
             group_id += 1
@@ -93,128 +170,157 @@ for term in terms_list:
 
 dragging = False
 selected_object = None
+drag_start_state = None  # (location, inverted) of the dragged object when picked up.
 
 def process_object(obj):
     """
-    Returns the effective sympy expression for an object.
+    Returns the effective expression for an object, ready for equation building.
     If the object is a function and has been inverted (moved across the equation),
-    apply its inverse function from the mapping.
+    use its inverse, precomputed from the mapping at parse time.
     """
-    effective_expr = obj["expr"]
-    if obj["inverted"] and obj["part"] == "func":
-        func = effective_expr.func
-        if func in inverse_mapping:
-            arg = effective_expr.args[0]
-            effective_expr = inverse_mapping[func](arg)
-    return effective_expr
+    if obj["inverted"] and obj["inverse_expr"] is not None:
+        return obj["inverse_expr"]
+    return obj["backend_expr"]
 
-def update_equation():
+# Memoized results keyed by where the objects sit. The initial expression never
+# changes after parsing, so these never need invalidating.
+_eq_cache = {}
+_sol_cache = {}
+
+def equation_signature():
+    """Hashable summary of each object's side and inversion; equal signatures give equal equations."""
+    return tuple(sorted((obj["id"], obj["location"], obj["inverted"]) for obj in draggable_objects))
+
+def build_equation():
     """
-    Rebuilds the equation based on the current positions/locations of the draggable objects.
+    Builds the equation based on the current positions/locations of the draggable objects.
     For compound terms (grouped objects), if the coefficient and the rest are on the same side,
     then the effective term is (coefficient * rest). If they are on opposite sides, the move
     implies dividing by the coefficient.
     For single objects, a term on the LHS is added and on the RHS subtracted.
     """
-    global history
-    lhs_expr = 0
-    processed_groups = set()
-    for obj in draggable_objects:
-        if obj["group"] is not None:
-            group = obj["group"]
-            if group in processed_groups:
-                continue
-            group_objs = [o for o in draggable_objects if o["group"] == group]
-            if len(group_objs) == 2:
-                coeff_obj = next((o for o in group_objs if o["part"] == "coeff"), None)
-                other_obj = next((o for o in group_objs if o["part"] != "coeff"), None)
-                if coeff_obj and other_obj:
-                    if coeff_obj["location"] == other_obj["location"]:
-                        effective = coeff_obj["expr"] * other_obj["expr"]
-                    else:
-                        effective = other_obj["expr"] / coeff_obj["expr"]
-                    sign = 1 if other_obj["location"] == "lhs" else -1
-                    lhs_expr += sign * effective
-            else:
-                for o in group_objs:
-                    sign = 1 if o["location"] == "lhs" else -1
-                    lhs_expr += sign * process_object(o)
-            processed_groups.add(group)
+    parts = []
+    for group in groups.values():
+        if len(group["members"]) == 2:
+            coeff_obj = group["coeff"]
+            other_obj = group["other"]
+            if coeff_obj and other_obj:
+                if coeff_obj["location"] == other_obj["location"]:
+                    effective = coeff_obj["backend_expr"] * other_obj["backend_expr"]
+                else:
+                    effective = other_obj["backend_expr"] / coeff_obj["backend_expr"]
+                sign = 1 if other_obj["location"] == "lhs" else -1
+                parts.append(sign * effective)
         else:
+            for o in group["members"]:
+                sign = 1 if o["location"] == "lhs" else -1
+                parts.append(sign * process_object(o))
+    for obj in draggable_objects:
+        if obj["group"] is None:
             sign = 1 if obj["location"] == "lhs" else -1
-            lhs_expr += sign * process_object(obj)
-    eq = sp.Eq(lhs_expr, 0)
-    history.append(f"Updated eq: {eq}")
+            parts.append(sign * process_object(obj))
+    return sp.Eq(sp.sympify(backend_sum(parts)), 0)
+
+def update_equation():
+    """Returns the equation for the current layout, reusing it if this layout was seen before."""
+    sig = equation_signature()
+    eq = _eq_cache.get(sig)
+    if eq is None:
+        eq = _eq_cache[sig] = build_equation()
+    add_history(f"Updated eq: {eq}")
     return eq
 
 def solve_eq(eq):
-    global solution, history
+    global solution
     try:
         # Solve for both x and y.
-        solution = sp.solve(eq, (x, y))
-        history.append(f"Solved eq: {eq} -> (x, y) = {solution}")
+        if eq not in _sol_cache:
+            _sol_cache[eq] = sp.solve(eq, (x, y))
+        solution = _sol_cache[eq]
+        show_solution()
+        add_history(f"Solved eq: {eq} -> (x, y) = {solution}")
     except Exception as e:
-        history.append(f"Error solving eq: {e}")
+        add_history(f"Error solving eq: {e}")
 
 def integrate_eq(eq):
-    global solution, history
+    global solution
     try:
         # Integrate with respect to x (example; adjust as needed).
         solution = sp.integrate(eq.lhs, x)
-        history.append(f"Integrated eq lhs: {eq.lhs} dx -> {solution}")
+        show_solution()
+        add_history(f"Integrated eq lhs: {eq.lhs} dx -> {solution}")
     except Exception as e:
-        history.append(f"Error integrating eq: {e}")
+        add_history(f"Error integrating eq: {e}")
 
 def differentiate_eq(eq):
-    global solution, history
+    global solution
     try:
         # Differentiate with respect to x (example; adjust as needed).
         solution = sp.diff(eq.lhs, x)
-        history.append(f"Differentiated eq lhs: {eq.lhs} -> {solution}")
+        show_solution()
+        add_history(f"Differentiated eq lhs: {eq.lhs} -> {solution}")
     except Exception as e:
-        history.append(f"Error differentiating eq: {e}")
+        add_history(f"Error differentiating eq: {e}")
+
+def scene_items():
+    """
+    Returns the (surface, position) pairs drawn on top of the static background,
+    in draw order: draggable terms, the solution line, then the recent history.
+    """
+    items = []
+    for obj in draggable_objects:
+        items.append((obj["surf"], obj["pos"]))
+    if solution is not None:
+        items.append((solution_surf, (20, 60)))
+    for i, surf in enumerate(recent_surfs):
+        items.append((surf, (20, 500 + 30 * i)))
+    return items
 
-def draw_text(text, pos, color=BLACK):
-    render = font.render(text, True, color)
-    screen.blit(render, pos)
+# Static scene (boxes and captions), drawn once and used to erase stale regions.
+background = pygame.Surface((WIDTH, HEIGHT)).convert()
+background.fill(WHITE)
+pygame.draw.rect(background, GRAY, (50, 150, 400, 200))   # LHS box
+pygame.draw.rect(background, GRAY, (750, 150, 400, 200))   # RHS box
+font.render_to(background, (200, 120), "LHS", BLACK)
+font.render_to(background, (900, 120), "RHS", BLACK)
+font.render_to(background, (WIDTH//2 - 20, 230), "=", BLACK)
+screen.blit(background, (0, 0))
+pygame.display.flip()
+drawn_items = set()
 
 running = True
 while running:
-    screen.fill(WHITE)
-    # Draw boxes for LHS and RHS.
-    pygame.draw.rect(screen, GRAY, (50, 150, 400, 200))   # LHS box
-    pygame.draw.rect(screen, GRAY, (750, 150, 400, 200))   # RHS box
-    draw_text("LHS", (200, 120))
-    draw_text("RHS", (900, 120))
-    draw_text("=", (WIDTH//2 - 20, 230))
+    # Repaint only the regions whose contents changed since the last frame.
+    items = scene_items()
+    dirty = [surf.get_rect(topleft=pos) for surf, pos in drawn_items.symmetric_difference(items)]
+    for rect in dirty:
+        screen.set_clip(rect)
+        screen.blit(background, rect, rect)
+        for surf, pos in items:
+            screen.blit(surf, pos)
+    screen.set_clip(None)
+    drawn_items = set(items)
     
-    # Draw draggable objects.
-    for obj in draggable_objects:
-        col = BLUE if obj["location"] == "lhs" else GREEN
-        draw_text(obj["text"], obj["pos"], col)
-    
-    # Display solution.
-    if solution is not None:
-        draw_text(f"Solution: (x, y) = {solution}", (20, 60), BLUE)
-    
-    # Display recent history.
-    y_offset = 500
-    for hist in history[-5:]:
-        draw_text(hist, (20, y_offset), GREEN)
-        y_offset += 30
-    
-    for event in pygame.event.get():
+    # Coalesce runs of MOUSEMOTION events: a fast drag queues many per frame, but only
+    # the last position of each run matters. Clicks keep their order relative to moves.
+    events = pygame.event.get()
+    events = [event for event, following in zip(events, events[1:] + [None])
+              if not (event.type == pygame.MOUSEMOTION and following is not None
+                      and following.type == pygame.MOUSEMOTION)]
+    for event in events:
         if event.type == pygame.QUIT:
             running = False
         
+        elif event.type == pygame.VIDEOEXPOSE:
+            # The window needs repainting; the screen surface still holds the full frame.
+            dirty.append(screen.get_rect())
+        
         elif event.type == pygame.MOUSEBUTTONDOWN:
-            mx, my = event.pos
-            for obj in draggable_objects:
-                ox, oy = obj["pos"]
-                if ox - 50 < mx < ox + 100 and oy - 20 < my < oy + 40:
-                    dragging = True
-                    selected_object = obj
-                    break
+            index = pygame.Rect(event.pos, (1, 1)).collidelist(hit_rects)
+            if index != -1:
+                dragging = True
+                selected_object = draggable_objects[index]
+                drag_start_state = (selected_object["location"], selected_object["inverted"])
         
         elif event.type == pygame.MOUSEBUTTONUP:
             dragging = False
@@ -223,16 +329,21 @@ while running:
                 # Set location based on where the object is dropped.
                 if ox < WIDTH//2:
                     selected_object["location"] = "lhs"
+                    selected_object["surf"] = selected_object["_surf_lhs"]
                 else:
                     selected_object["location"] = "rhs"
+                    selected_object["surf"] = selected_object["_surf_rhs"]
                 # For function objects, mark as inverted if moved to RHS.
                 if selected_object["part"] == "func":
                     selected_object["inverted"] = (selected_object["location"] == "rhs")
-                eq = update_equation()
+                # A drop back on the same side leaves the equation unchanged.
+                if (selected_object["location"], selected_object["inverted"]) != drag_start_state:
+                    eq = update_equation()
             selected_object = None
         
         elif event.type == pygame.MOUSEMOTION and dragging:
             selected_object["pos"] = event.pos
+            selected_object["rect"].topleft = (event.pos[0] - 50, event.pos[1] - 20)
         
         elif event.type == pygame.KEYDOWN:
             # S to solve, I to integrate, D to differentiate.
@@ -246,7 +357,9 @@ while running:
                 eq = update_equation()
                 differentiate_eq(eq)
     
-    pygame.display.flip()
+    pygame.display.update(dirty)
+    # Sleep between frames; an idle UI does not need the full drag frame rate.
+    clock.tick(60 if dragging else 30)
 
 pygame.quit()
 